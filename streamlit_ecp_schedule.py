@@ -1,18 +1,49 @@
+import contextlib
+import json
+import logging
+import os
+import tempfile
 import streamlit as st
-import streamlit.components.v1 as components
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from gridstatusio import GridStatusClient
+from gridstatusio.gs_client import RETRIABLE_STATUS_CODES
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly_resampler import FigureResampler
+
+# serialize figures with orjson rather than the stdlib json fallback
+pio.json.config.default_engine = "orjson"
 
 # ─── APP VERSION ───────────────────────────────────────────────────────────────
 VERSION = "1.0.2"
 
+logger = logging.getLogger(__name__)
+
 # ─── PAGE CONFIG ─────────────────────────────────────────────────────────────
 st.set_page_config(
     page_title="ERCOT CP Load Live Dashboard",
     layout="wide",
     initial_sidebar_state="collapsed",
+    page_icon="⚡",
+    menu_items={"Get help": None, "Report a bug": None, "About": None},
+)
+
+# ─── HIDE STREAMLIT DEFAULT UI ─────────────────────────────────────────────────
+# emitted once, straight after page config; the live fragment never replays it
+st.markdown(
+    """
+    <style>
+      #MainMenu, footer, header {visibility: hidden;}
+    </style>
+    """,
+    unsafe_allow_html=True,
 )
 
 # ─── HEADER WITH LOGO, TITLE, CREDIT & VERSION ────────────────────────────────
@@ -46,108 +77,208 @@ with col2:
         unsafe_allow_html=True,
     )
 
-# ─── JS REFRESH SCHEDULER FOR :01, :16, :31, :46 ─────────────────────────────
-components.html(
-    """
-    <script>
-      (function() {
-        const schedule = [1, 16, 31, 46];
-        const now = new Date();
-        let next = schedule.find(m => now.getMinutes() < m);
-        if (next === undefined) next = schedule[0] + 60;
-        let delta = (next - now.getMinutes()) * 60 - now.getSeconds();
-        if (delta < 0) delta += 3600;
-        setTimeout(() => window.location.reload(), delta * 1000);
-      })();
-    </script>
-    """,
-    height=0,
-)
-
 # ─── CLIENT SINGLETON ─────────────────────────────────────────────────────────
+class PooledGridStatusClient(GridStatusClient):
+    # stock client calls requests.get per request (new TCP + TLS handshake
+    # each time); reuse one pooled session and let its adapter do retries
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.base_delay,
+            status_forcelist=sorted(RETRIABLE_STATUS_CODES),
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+
+    def _get_with_retry(self, url, params, headers, verbose=False):
+        response = self.session.get(url, params=params, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Error {response.status_code}: {response.text}")
+        return response
+
 @st.cache_resource
 def get_client():
-    return GridStatusClient()
+    return PooledGridStatusClient()
 
 client = get_client()
 
+# ─── CHART SERIES ─────────────────────────────────────────────────────────────
+cols = [
+    "operational_load",
+    "internal_generation",
+    "wholesale_storage_load",
+    "net_dc_tie_flow",
+    "dc_tie_exports",
+    "dc_tie_imports",
+    "estimated_cp_load",
+    "estimated_cp_load_using_gen",
+]
+KEEP = ["interval_start_local", *cols]
+CACHE_PATH = Path(__file__).resolve().parent / "ecp_cache.parquet"
+
+# ─── ON-DISK HISTORY CACHE ────────────────────────────────────────────────────
+def load_cached_history() -> pd.DataFrame | None:
+    # a missing, truncated or old-layout cache is treated as absent and rebuilt
+    try:
+        df = pd.read_parquet(CACHE_PATH, engine="pyarrow")
+    except (OSError, ValueError):
+        return None
+    if not isinstance(df.index, pd.DatetimeIndex) or df.index.tz is None:
+        return None
+    if not set(cols).issubset(df.columns):
+        return None
+    return df
+
+def save_cached_history(df: pd.DataFrame) -> None:
+    # write to a temp file beside the cache and swap it in, so a process
+    # killed mid-write never leaves a truncated cache behind; a failed write
+    # (read-only dir, full disk) only loses the cache, never the dashboard
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(
+            dir=CACHE_PATH.parent, prefix="ecp_cache.", suffix=".tmp"
+        )
+        os.close(fd)
+        tmp = Path(tmp)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; match a plain write
+        df.to_parquet(tmp, engine="pyarrow")
+        tmp.replace(CACHE_PATH)
+    except OSError:
+        logger.warning("could not write history cache %s", CACHE_PATH, exc_info=True)
+    finally:
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                tmp.unlink(missing_ok=True)
+
 # ─── DATA FETCH ───────────────────────────────────────────────────────────────
-@st.cache_data(ttl=24 * 3600)  # full 2-week history cached once per day
+def bin_floor(ts: datetime) -> datetime:
+    # snap to the 5-min interval boundary so query URLs repeat within a bin
+    ts = ts.replace(second=0, microsecond=0)
+    return ts - timedelta(minutes=ts.minute % 5)
+
+def iso_utc(ts: datetime) -> str:
+    return ts.replace(tzinfo=None).isoformat(timespec="seconds") + "Z"
+
+def prepare_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # drop unused columns, then parse timestamps and narrow dtypes once at
+    # ingest; parquet keeps both
+    df = df[KEEP].copy()
+    df["interval_start_local"] = pd.to_datetime(
+        df["interval_start_local"], format="ISO8601", cache=True
+    )
+    df[cols] = df[cols].astype("float32")
+    df.set_index("interval_start_local", inplace=True)
+    return df
+
+def append_intervals(older: pd.DataFrame, newer: pd.DataFrame) -> pd.DataFrame:
+    # newer wins on overlapping intervals; both inputs are already sorted, so
+    # the result usually is too and the O(N log N) sort can be skipped
+    df = pd.concat([older, newer])
+    df = df[~df.index.duplicated(keep="last")]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind="stable")
+    return df
+
+@st.cache_data(ttl=5 * 60, show_spinner=False)  # top up the cached gap every 5-min bin
 def fetch_full_history(days: int = 14) -> pd.DataFrame:
-    end = datetime.now(timezone.utc)
-    start = end - timedelta(days=days)
+    end = bin_floor(datetime.now(timezone.utc))
+    cutoff = end - timedelta(days=days)
+    cached_df = load_cached_history()
+    if cached_df is None or cached_df.empty:
+        start = cutoff
+    else:
+        # only request the gap between the newest cached interval and now
+        start = max(cached_df.index.max().tz_convert("UTC"), cutoff)
     df = client.get_dataset(
         dataset="ercot_estimated_coincident_peak_load",
-        start=start.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        end=end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        start=iso_utc(start),
+        end=iso_utc(end),
         timezone="market",
     )
-    df["interval_start_local"] = pd.to_datetime(df["interval_start_local"])
+    df = prepare_frame(df)
+    if cached_df is not None:
+        df = append_intervals(cached_df, df)
+    df = df[df.index >= cutoff]
+    save_cached_history(df)
     return df
 
-@st.cache_data(ttl=15 * 60)  # cache latest 15 min fetch for 15 minutes
+@st.cache_data(ttl=5 * 60, show_spinner=False, max_entries=4)  # one 5-min bin
 def fetch_latest(minutes: int = 15) -> pd.DataFrame:
-    now = datetime.now(timezone.utc)
-    start = now - timedelta(minutes=minutes)
+    end = bin_floor(datetime.now(timezone.utc))
+    start = end - timedelta(minutes=minutes)
     df = client.get_dataset(
         dataset="ercot_estimated_coincident_peak_load",
-        start=start.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        end=now.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        start=iso_utc(start),
+        end=iso_utc(end),
         timezone="market",
     )
-    df["interval_start_local"] = pd.to_datetime(df["interval_start_local"])
-    return df
+    return prepare_frame(df)
 
-# Combine full history + latest
-data_full = fetch_full_history()
-data_latest = fetch_latest()
-df = pd.concat([data_full, data_latest]) \
-    .drop_duplicates("interval_start_local") \
-    .sort_values("interval_start_local")
+# ─── PLOTLY MULTI-LINE CHART ─────────────────────────────────────────────────
+@st.cache_data(show_spinner=False, max_entries=4)
+def build_fig_json(last_ts: pd.Timestamp, n_rows: int, _df: pd.DataFrame) -> str:
+    # keyed on the newest interval and row count (the frame itself is not
+    # hashed), so reruns over unchanged data reuse the serialized figure
+    # LTTB-downsample each series server-side. Streamlit has no Dash callback
+    # server, so this is a static view: zooming does not re-aggregate.
+    fig = FigureResampler(
+        go.Figure(),
+        default_n_shown_samples=1000,
+        resampled_trace_prefix_suffix=("", ""),
+        show_mean_aggregation_size=False,
+    )
+    # keep the tz-aware index: wall-clock times repeat at the DST fall-back
+    # hour, and the resampler requires monotonically increasing x
+    x = _df.index
+    # one contiguous float32 block (series-major, so each row is a contiguous
+    # trace) instead of a block-manager lookup per column
+    mat = np.ascontiguousarray(_df[cols].to_numpy(dtype=np.float32).T)
+    for i, c in enumerate(cols):
+        fig.add_trace(go.Scattergl(name=c, mode="lines"), hf_x=x, hf_y=mat[i])
+    fig.update_layout(
+        template="plotly_dark",
+        xaxis_title="Local Time",
+        yaxis_title="MW",
+        height=900,
+        hovermode="x unified",
+        legend=dict(title="Series", orientation="h", y=1.02, x=1, xanchor="right"),
+        margin=dict(t=180, r=60, b=60, l=60),
+    )
+    return pio.to_json(fig, validate=False, pretty=False)
 
-# ─── FOOTER INFO ──────────────────────────────────────────────────────────────
-st.markdown(
-    f"**Last updated (UTC):** {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%SZ}   \n"
-    f"**Next refresh at** :01, :16, :31, and :46 of each hour",
-    unsafe_allow_html=True,
-)
+# ─── LIVE DATA + CHART (FRAGMENT) ───────────────────────────────────────────
+# only this block reruns on the 5-min timer; header, logo and CSS are sent
+# once per session instead of being replayed by a full-page reload
+@st.fragment(run_every="5min")
+def live_block():
+    # Fetch both concurrently (spinners are off: worker threads have no script
+    # context), then append latest, which wins on overlapping intervals
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_full = ex.submit(fetch_full_history)
+        f_latest = ex.submit(fetch_latest)
+        data_full, data_latest = f_full.result(), f_latest.result()
+    df = append_intervals(data_full, data_latest)
 
-# ─── PLOTLY MULTI-LINE CHART ─────────────────────────────────────────────────
-cols = [
-    "operational_load",
-    "internal_generation",
-    "wholesale_storage_load",
-    "net_dc_tie_flow",
-    "dc_tie_exports",
-    "dc_tie_imports",
-    "estimated_cp_load",
-    "estimated_cp_load_using_gen",
-]
-fig = px.line(
-    df,
-    x="interval_start_local",
-    y=cols,
-    labels={"interval_start_local": "Local Time", "value": "MW", "variable": "Series"},
-    template="plotly_dark",
-)
-fig.update_layout(
-    height=900,
-    hovermode="x unified",
-    legend=dict(title="Series", orientation="h", y=1.02, x=1, xanchor="right"),
-    margin=dict(t=180, r=60, b=60, l=60),
-)
-st.plotly_chart(fig, use_container_width=True, height=950)
+    # footer info
+    st.markdown(
+        f"**Last updated (UTC):** {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%SZ}   \n"
+        f"**Refreshes** every 5 minutes",
+        unsafe_allow_html=True,
+    )
 
-# ─── RAW DATA EXPANDER ─────────────────────────────────────────────────────────
-with st.expander("Show raw data"):
-    st.dataframe(df.set_index("interval_start_local"), use_container_width=True)
+    fig_json = build_fig_json(df.index[-1], len(df), df)
+    st.plotly_chart(
+        json.loads(fig_json), use_container_width=True, height=950, key="ecp_chart"
+    )
 
-# ─── HIDE STREAMLIT DEFAULT UI ─────────────────────────────────────────────────
-st.markdown(
-    """
-    <style>
-      #MainMenu, footer, header {visibility: hidden;}
-    </style>
-    """,
-    unsafe_allow_html=True,
-)
+    # expander bodies run eagerly, so gate the table behind a checkbox and only
+    # ship the most recent rows to the browser
+    if st.checkbox("Show raw data"):
+        st.dataframe(df.tail(500), use_container_width=True)
+
+live_block()